@@ -1,10 +1,16 @@
 """ Module containing implementations of commands supported by the emulator. """
+import codecs
 import os
-import re
-import subprocess
-from abc import abstractmethod
+import signal
 
-from src.greputils import GrepArguments, GrepOutputFormatter, ParsingException
+# Modules needed only by some of the commands (subprocess, tempfile, shutil, src.greputils with argparse)
+# are imported inside of them, so that starting the emulator does not pay for loading them.
+_BUFFER_SIZE = 128 * 1024
+_SENDFILE_THRESHOLD = 64 * 1024
+_BROKEN_PIPE_CODE = -getattr(signal, 'SIGPIPE', 0)
+# Maps ASCII whitespace bytes (the ones str.split splits on) to b' ' and all other ASCII bytes to b'x',
+# so every word starts with b' x'.
+_WORD_TABLE = bytes(ord(' ') if chr(byte).isspace() else ord('x') for byte in range(128)) + b'x' * 128
 
 
 class CommandException(Exception):
@@ -12,9 +18,14 @@ class CommandException(Exception):
 
 
 class Command(object):
-    """ The base class for all commands supported by the interpreter. """
+    """ The base class for all commands supported by the interpreter.
+
+    A command that can write its result straight to a file descriptor sets stream
+    to a function stream(args, input, output) taking the descriptor as output.
+    """
+    stream = None
+
     @staticmethod
-    @abstractmethod
     def run(args, input):
         """ Emulates running a command.
 
@@ -42,14 +53,59 @@ class Cat(Command):
         """
         if not args:
             return input
-        result = ''
+        if len(args) == 1:
+            return Cat._read(args[0])
+        return ''.join([Cat._read(file_name) for file_name in args])
+
+    @staticmethod
+    def _read(file_name):
+        try:
+            with open(file_name, 'r', buffering=_BUFFER_SIZE) as fin:
+                return fin.read()
+        except IOError as exception:
+            raise CommandException('cat: {}'.format(exception))
+
+    @staticmethod
+    def stream(args, input, output):
+        """ Writes the contents of the given files straight to a file descriptor.
+
+        Files of at least _SENDFILE_THRESHOLD bytes are copied by the kernel with os.sendfile
+        where the system supports it, so their contents are never read into the interpreter.
+        Smaller files are copied through a buffer, for them a system call costs more than it saves.
+
+        :param args: A list of the names of files, the contents of which should be written.
+        :param input: The input for the command, should be returned if no arguments are given.
+        :param output: A file descriptor to write the contents to.
+        :return: The standard input if no files are given, or an empty string as the files were written.
+        :raise: CommandException if a file's contents could not be read.
+        """
+        if not args:
+            return input
         for file_name in args:
             try:
-                with open(file_name, 'r') as fin:
-                    result += fin.read()
+                with open(file_name, 'rb') as fin:
+                    Cat._copy(fin, output)
             except IOError as exception:
                 raise CommandException('cat: {}'.format(exception))
-        return result
+        return ''
+
+    @staticmethod
+    def _copy(fin, output):
+        import shutil
+        size = os.fstat(fin.fileno()).st_size
+        if size >= _SENDFILE_THRESHOLD and hasattr(os, 'sendfile'):
+            offset = 0
+            try:
+                while offset < size:
+                    sent = os.sendfile(output, fin.fileno(), offset, size - offset)
+                    if not sent:
+                        return
+                    offset += sent
+                return
+            except OSError:  # The output does not support sendfile, copy the rest through a buffer
+                fin.seek(offset)
+        with open(output, 'wb', closefd=False) as fout:
+            shutil.copyfileobj(fin, fout, _BUFFER_SIZE)
 
 
 class Echo(Command):
@@ -68,24 +124,82 @@ class External(Command):
 
         Returns the result of running an external command with given arguments on the given input.
         The command that is going to be run should be passed as the first argument.
+        If there is no input, the command's standard input is empty rather than inherited.
 
         :param args: A list of arguments passed (the first argument is the command).
         :param input: An input string passed to the command.
         :return: A string containing the result of the command's execution.
         :raise: CommandException if an error occurred while running the command.
         """
+        import subprocess
         if not args:
             return
         encoded_input = input.encode() if input else None
+        process = External._start(args, subprocess.PIPE if encoded_input else None, subprocess.PIPE)
+        output, error = process.communicate(encoded_input)
+        if process.returncode:
+            raise CommandException(error.decode().rstrip())
+        return output.decode().rstrip()
+
+    @staticmethod
+    def run_pipeline(commands, input):
+        """ Runs a pipeline of external commands connected to each other with OS pipes.
+
+        All of the commands are started at once and each of them reads the output of the previous one
+        directly, so the intermediate results never pass through the interpreter.
+        A command killed for writing to a finished command is not considered to have failed.
+
+        :param commands: A list of commands, each of them a list of arguments as passed to run.
+        :param input: An input string passed to the first command.
+        :return: A string containing the result of the last command's execution.
+        :raise: CommandException if an error occurred while running any of the commands.
+        """
+        import tempfile
+        if len(commands) == 1:
+            return External.run(commands[0], input)
+        stdin = External._input_file(input) if input else None
+        processes, error_files = [], []
         try:
-            result = subprocess.run(args, check=True, input=encoded_input,
-                                    stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-            return result.stdout.decode().rstrip()
-        except subprocess.CalledProcessError as error:
-            raise CommandException(error.stderr.decode().rstrip())
+            for args in commands:
+                error_files.append(tempfile.TemporaryFile())
+                processes.append(External._start(args, stdin, error_files[-1]))
+                if stdin is not None:
+                    stdin.close()
+                stdin = processes[-1].stdout
+            output = processes[-1].communicate()[0]
+            for process, error_file in zip(processes, error_files):
+                if process.wait() not in (0, _BROKEN_PIPE_CODE):
+                    error_file.seek(0)
+                    raise CommandException(error_file.read().decode().rstrip())
+            return output.decode().rstrip()
+        finally:
+            if stdin is not None:
+                stdin.close()
+            for process in processes:
+                if process.poll() is None:
+                    process.kill()
+                    process.wait()
+            for error_file in error_files:
+                error_file.close()
+
+    @staticmethod
+    def _start(args, stdin, stderr):
+        """ Starts a command reading from stdin, or from nothing if it is None, and writing into a new pipe. """
+        import subprocess
+        try:
+            return subprocess.Popen(args, stdin=subprocess.DEVNULL if stdin is None else stdin,
+                                    stdout=subprocess.PIPE, stderr=stderr)
         except FileNotFoundError:
             raise CommandException('{}: command not found...'.format(args[0]))
 
+    @staticmethod
+    def _input_file(input):
+        import tempfile
+        input_file = tempfile.TemporaryFile()
+        input_file.write(input.encode())
+        input_file.seek(0)
+        return input_file
+
 
 class Grep(Command):
     """ Class for emulating running the grep command. """
@@ -104,6 +218,7 @@ class Grep(Command):
         :return: A string containing a list of matches for the pattern.
         :raise: CommandException if the command's arguments are invalid.
         """
+        from src.greputils import GrepArguments, GrepOutputFormatter, ParsingException
         try:
             parsed_args = GrepArguments(args)
         except ParsingException as exception:
@@ -111,7 +226,7 @@ class Grep(Command):
         output = GrepOutputFormatter(len(parsed_args.files), parsed_args.was_context_set)
 
         if not parsed_args.files and input:
-            Grep._get_matches(output, '', parsed_args, input.splitlines(True))
+            Grep._get_matches(output, '', parsed_args, input)
         for file in parsed_args.files:
             Grep._process_file(output, parsed_args, file)
         return output.format()
@@ -119,29 +234,99 @@ class Grep(Command):
     @staticmethod
     def _process_file(output, parsed_args, file_name):
         try:
-            with open(file_name, 'r') as fin:
-                file_contents = fin.readlines()
+            with open(file_name, 'r', buffering=_BUFFER_SIZE) as fin:
+                index, context = 0, 0
+                for chunk in Grep._read_chunks(fin):
+                    index, context = Grep._get_matches(output, file_name, parsed_args, chunk, index, context)
         except IOError as exception:
             raise CommandException('grep: {}'.format(exception))
-        Grep._get_matches(output, file_name, parsed_args, file_contents)
 
     @staticmethod
-    def _get_matches(output, file_name, parsed_args, text):
-        print_end = -1
-        for i, line in enumerate(text):
-            if re.search(parsed_args.pattern, line):
-                print_end = i + parsed_args.after_context
-                output.add_line(file_name, i, line, True)
-            elif i <= print_end:
-                output.add_line(file_name, i, line, False)
+    def _read_chunks(fin):
+        """ Yields the contents of a text file in chunks of whole lines, about _BUFFER_SIZE characters each. """
+        chunk = fin.read(_BUFFER_SIZE)
+        while chunk:
+            if not chunk.endswith('\n'):
+                chunk += fin.readline()
+            yield chunk
+            chunk = fin.read(_BUFFER_SIZE)
+
+    @staticmethod
+    def _get_matches(output, file_name, parsed_args, text, index=0, context=0):
+        """ Adds the lines of the text matching the pattern and their trailing context to the output.
+
+        The text may be a part of a file made of whole lines. In that case index is the index
+        of its first line in the file and context is the amount of context lines still to be added
+        after the end of the previous part.
+
+        :return: The index of the line following the text and the amount of context lines still to be added.
+        """
+        position = 0
+        for line_start, line_end in Grep._find_matching_lines(parsed_args, text):
+            position, index, context = Grep._add_context(output, file_name, text, position, index, line_start, context)
+            index += text.count('\n', position, line_start)
+            output.add_line(file_name, index, text[line_start:line_end], True)
+            position, index, context = line_end, index + 1, parsed_args.after_context
+        position, index, context = Grep._add_context(output, file_name, text, position, index, len(text), context)
+        return index + text.count('\n', position), context
+
+    @staticmethod
+    def _add_context(output, file_name, text, position, index, end, amount):
+        while amount and position < end:
+            line_end = Grep._line_end(text, position)
+            output.add_line(file_name, index, text[position:line_end], False)
+            position, index, amount = line_end, index + 1, amount - 1
+        return position, index, amount
+
+    @staticmethod
+    def _find_matching_lines(parsed_args, text):
+        """ Yields the bounds of the lines of the text containing a match for the pattern.
+
+        When the pattern allows it, the whole text is searched at once instead of line by line,
+        so the regex engine skips over the non-matching lines without returning to the interpreter.
+        """
+        if parsed_args.text_pattern is None:
+            yield from Grep._find_matching_lines_one_by_one(parsed_args, text)
+            return
+        position = 0
+        while position < len(text):
+            match = parsed_args.text_pattern.search(text, position)
+            # An empty match after the last line break does not belong to any line.
+            if match is None or match.start() == len(text) and text.endswith('\n'):
+                return
+            line_start = text.rfind('\n', 0, match.start()) + 1
+            line_end = Grep._line_end(text, match.start())
+            yield line_start, line_end
+            position = line_end
+
+    @staticmethod
+    def _find_matching_lines_one_by_one(parsed_args, text):
+        position = 0
+        while position < len(text):
+            line_end = Grep._line_end(text, position)
+            if parsed_args.pattern.search(text[position:line_end]):
+                yield position, line_end
+            position = line_end
+
+    @staticmethod
+    def _line_end(text, position):
+        return text.find('\n', position) + 1 or len(text)
 
 
 class Pwd(Command):
     """ Class for emulating running the pwd command. """
+    _working_directory = None
+
     @staticmethod
     def run(args, input):
-        """ Returns the name of the current working directory. """
-        return os.getcwd()
+        """ Returns the name of the current working directory.
+
+        The emulator has no command for changing the directory,
+        so it is only queried from the system on the first call.
+        """
+        if Pwd._working_directory is None:
+            Pwd._working_directory = os.getcwd()
+        return Pwd._working_directory
 
 
 class Wc(Command):
@@ -157,12 +342,62 @@ class Wc(Command):
         """
         if args:
             try:
-                with open(args[0], 'r') as fin:
-                    input = fin.read()
+                with open(args[0], 'rb', buffering=0) as fin:
+                    lines, words, size = Wc._count(Wc._read_chunks(fin))
             except IOError as exception:
                 raise CommandException('wc: {}'.format(exception))
-        if input:
-            lines = input.count('\n') + 1
-            words = len(input.split())
-            bytes = len(input)
-            return '{} {} {}'.format(lines, words, bytes)
+        elif input:
+            lines, words, size = Wc._count([input.encode()])
+        else:
+            return None
+        if size:
+            return '{} {} {}'.format(lines + 1, words, size)
+
+    @staticmethod
+    def _read_chunks(fin):
+        """ Yields the contents of an unbuffered binary file in chunks, all read into the same buffer. """
+        buffer = bytearray(_BUFFER_SIZE)
+        size = fin.readinto(buffer)
+        while size:
+            yield buffer if size == len(buffer) else buffer[:size]
+            size = fin.readinto(buffer)
+
+    @staticmethod
+    def _count(chunks):
+        """ Counts the newlines, words and bytes in a text split into non-empty chunks of bytes.
+
+        The text is processed one chunk at a time, so a file never has to be read whole.
+        Words are counted by their first bytes, so nothing is allocated per word,
+        and a word cut in two by the chunk boundary is only counted once.
+        Once a chunk has bytes outside of ASCII, the rest of the text is decoded from UTF-8 and split as a string,
+        so that Unicode whitespace (such as a no-break space) separates words the same as in str.split.
+        """
+        lines, words, size = 0, 0, 0
+        in_word = False
+        decoder = None
+        for chunk in chunks:
+            lines += chunk.count(b'\n')
+            size += len(chunk)
+            if decoder is None and chunk.isascii():
+                classes = chunk.translate(_WORD_TABLE)
+                words += classes.count(b' x')
+                if not in_word and classes.startswith(b'x'):
+                    words += 1
+                in_word = classes.endswith(b'x')
+                continue
+            if decoder is None:
+                decoder = codecs.getincrementaldecoder('utf-8')('replace')
+            words, in_word = Wc._count_words(decoder.decode(chunk), words, in_word)
+        if decoder is not None:
+            words, in_word = Wc._count_words(decoder.decode(b'', True), words, in_word)
+        return lines, words, size
+
+    @staticmethod
+    def _count_words(text, words, in_word):
+        """ Adds the words of the next part of a text to the count, not counting a word continued from before. """
+        if not text:
+            return words, in_word
+        words += len(text.split())
+        if in_word and not text[0].isspace():
+            words -= 1
+        return words, not text[-1].isspace()
@@ -1,5 +1,6 @@
 """ Module responsible for the details of parsing and formatting for the grep function. """
 import argparse
+import io
 import os
 import re
 
@@ -28,15 +29,24 @@ class _GrepParser(argparse.ArgumentParser):
         return parser
 
 
+# Parsing does not change the parser, so a single one is built for all of the grep calls.
+_PARSER = _GrepParser.parser()
+# Finds the parts of a pattern source that may let a match contain a line break or depend on the string boundaries:
+# escaped letters and digits other than \w, \d, \S, \b and \B, negated character sets,
+# extensions other than (?:...) (lookarounds and inline flags such as (?s)) and control characters.
+_MULTILINE_UNSAFE_SEARCH = re.compile(r'\\[A-Za-z0-9_](?<![wdSbB])|\[\^|\(\?(?!:)|[\x00-\x1f]').search
+
+
 class GrepArguments(object):
     """ Class responsible for storing the parsed grep command-line arguments. """
     def __init__(self, args):
         """ Parses the passed arguments and stores the relevant information. """
-        parsed_args = _GrepParser.parser().parse_args(args)
+        parsed_args = _PARSER.parse_args(args)
         self.files = parsed_args.FILE
         self.after_context = GrepArguments._extract_after_context(parsed_args)
         self.was_context_set = parsed_args.after_context is not None
         self.pattern = GrepArguments._extract_pattern(parsed_args)
+        self.text_pattern = GrepArguments._extract_text_pattern(self.pattern)
 
     @staticmethod
     def _extract_pattern(parsed_args):
@@ -46,6 +56,21 @@ class GrepArguments(object):
             pattern = r'\b' + pattern + r'\b'
         return re.compile(pattern, case)
 
+    @staticmethod
+    def _extract_text_pattern(pattern):
+        """ Returns the pattern for searching a whole text at once, or None if it cannot be used.
+
+        Searching the whole text finds exactly the lines that searching each line on its own would find
+        only if a match can never contain a line break and does not depend on the string boundaries.
+        This is decided from the pattern source conservatively, any doubtful pattern is searched line by line.
+        """
+        if _MULTILINE_UNSAFE_SEARCH(pattern.pattern):
+            return None
+        # An empty match right after the line break at the end of a line would be lost.
+        if pattern.search('\n', 1):
+            return None
+        return re.compile(pattern.pattern, pattern.flags | re.MULTILINE)
+
     @staticmethod
     def _extract_after_context(parsed_args):
         after_context = 0 if parsed_args.after_context is None else parsed_args.after_context
@@ -65,11 +90,15 @@ class GrepOutputFormatter(object):
         depends on the amount of files passed to grep.
         Whether it will be splitting match entries with the separator '--'
         depends on whether the flag -A was specified to the parser.
+        Each combination of the two gets its own variant of add_line,
+        so that these conditions are not rechecked for every line.
         """
-        self._needs_file = file_amount > 1
-        self._needs_splitter = needs_splitter
-        self._last_entry = -1
-        self._lines = []
+        self._last_entry = None
+        self._output = io.StringIO()
+        if not needs_splitter:
+            self.add_line = self._add_line_with_file if file_amount > 1 else self._add_bare_line
+        elif file_amount <= 1:
+            self.add_line = self._add_line_with_splitter
 
     def add_line(self, file, index, line, is_match):
         """ Adds a line and formats it appropriately.
@@ -87,23 +116,26 @@ class GrepOutputFormatter(object):
         :param line: A string containing the line to be added to the output.
         :param is_match: A bool variable, whether the line matches the pattern.
         """
-        line = self._add_file(file, line, is_match)
         self._add_splitter(file, index)
-        self._last_entry = file, index
-        self._lines.append(line)
+        self._output.write(file + (':' if is_match else '-') + line)
+
+    def _add_line_with_splitter(self, file, index, line, is_match):
+        self._add_splitter(file, index)
+        self._output.write(line)
 
-    def _add_file(self, file, line, is_match):
-        if self._needs_file:
-            dividing_symbol = ':' if is_match else '-'
-            line = '{}{}{}'.format(file, dividing_symbol, line)
-        return line
+    def _add_line_with_file(self, file, index, line, is_match):
+        self._output.write(file + (':' if is_match else '-') + line)
+
+    def _add_bare_line(self, file, index, line, is_match):
+        self._output.write(line)
 
     def _add_splitter(self, file, index):
-        if self._needs_splitter and self._last_entry != -1:
+        if self._last_entry is not None:
             last_file, last_index = self._last_entry
             if last_file != file or last_index + 1 < index:
-                self._lines.append(self._SEPARATOR)
+                self._output.write(self._SEPARATOR)
+        self._last_entry = file, index
 
     def format(self):
         """ Returns a string containing the formatted lines. """
-        return ''.join(self._lines)
+        return self._output.getvalue()
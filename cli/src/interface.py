@@ -1,6 +1,7 @@
 """ Module containing the interface of the bash emulator for interacting with the user. """
 
 import os
+import sys
 
 from src.interpreter import Interpreter
 from src.parseutils import QuoteParser
@@ -14,11 +15,19 @@ class Reader(object):
 
          New lines continue to be queried while the quotes do not match,
          or while the input ends with a pipe.
+         The quotes are tracked line by line, so every line is only scanned once.
          """
-        result = input('$ ')
-        while not QuoteParser.quotes_match(result) or result.rstrip().endswith('|'):
-            result += os.linesep + input('> ')
-        return result
+        line = input('$ ')
+        lines = [line]
+        state = QuoteParser.scan(line)
+        ends_with_pipe = line.rstrip().endswith('|')
+        while not QuoteParser.is_closed(state) or ends_with_pipe:
+            line = input('> ')
+            lines.append(line)
+            state = QuoteParser.scan(line, state)
+            if line.strip():
+                ends_with_pipe = line.rstrip().endswith('|')
+        return os.linesep.join(lines)
 
 
 class CommandLineInterface(object):
@@ -29,7 +38,7 @@ class CommandLineInterface(object):
         emulator = Interpreter()
         while emulator.is_running:
             user_input = Reader.read()
-            result = emulator.execute_pipeline(user_input)
+            result = emulator.execute_pipeline(user_input, sys.stdout)
             if result:
                 print(result)
 
@@ -1,6 +1,6 @@
 """ Module responsible for the main logic for the bash emulator. """
 
-import re
+import sys
 from os import environ
 
 from src.commands import Echo, Cat, Grep, Wc, External, Pwd, CommandException
@@ -9,13 +9,20 @@ from src.parseutils import CommandExpander, PipelineSplitter
 
 class _EnvironmentVariables(object):
     """ Class responsible for interactions with the interpreter's existing variables. """
+    __slots__ = ('variables', '_get_variable')
+
     def __init__(self, variables):
         """ Initializes an internal dictionary of variables for the interpreter. """
         self.variables = variables
+        self._get_variable = variables.get
 
     def __getitem__(self, name):
-        """ Returns the variable's in-interpreter value if it exists, or the environment value. """
-        return self.variables.get(name, environ.get(name, ''))
+        """ Returns the variable's in-interpreter value if it exists, or the environment value.
+
+        The environment is only consulted when the interpreter does not have the variable.
+        """
+        value = self._get_variable(name)
+        return value if value is not None else environ.get(name, '')
 
     def __setitem__(self, name, value):
         """ Sets the given variable's value. """
@@ -24,18 +31,29 @@ class _EnvironmentVariables(object):
 
 class _InterpreterCommands(object):
     """ Class encapsulating the commands supported by a specific interpreter. """
+    __slots__ = ('commands', 'streams')
+
     def __init__(self, command_list):
-        self.commands = command_list
+        """ Stores the runners of the command classes by their interned names.
+
+        Looking up an interned name compares pointers.
+        The stream functions of the commands that have them are stored separately.
+        """
+        names = {sys.intern(name): command for name, command in command_list.items()}
+        self.commands = {name: command.run for name, command in names.items()}
+        self.streams = {name: command.stream for name, command in names.items() if command.stream is not None}
 
     def __getitem__(self, command_name):
-        """ Returns a command runner by name or the External command if it is not supported. """
-        return self.commands.get(command_name, External)
+        """ Returns a command runner by name or the External command runner if it is not supported. """
+        return self.commands.get(command_name, External.run)
+
+    def stream(self, command_name):
+        """ Returns the stream function of a command by name, or None if it has none. """
+        return self.streams.get(command_name)
 
 
 class Interpreter(object):
     """ Class responsible for emulating the bash shell. """
-    _ASSIGNMENT_PATTERN = re.compile(r'\w+?=\w*')
-
     def __init__(self):
         """ Initializes the existing variables and the list of commands available for execution. """
         self.is_running = True
@@ -47,39 +65,81 @@ class Interpreter(object):
                                                          'pwd': Pwd,
                                                          'grep': Grep})
 
-    def execute_pipeline(self, commands):
+    def execute_pipeline(self, commands, output=None):
         """ Emulates executing a pipeline of commands and returns their result.
 
         Each next command in the pipeline is called with the appropriate arguments
         and using the result of the previous command's execution as its input.
+        Consecutive external commands are run together, connected with OS pipes.
+        If the pipeline ends with a command that has a stream function (such as cat)
+        and an output with a file descriptor is given, the command writes its result to the output directly.
 
         :param commands: A string of pipe-separated commands to execute.
+        :param output: An optional file object the result is going to be written to.
         :return: A string with value the last command returns, or None if it returns nothing.
         """
         current_input = None
-        for command in PipelineSplitter.split_into_commands(commands):
-            expanded_command = self._expander.parse(command)
-            try:
-                current_input = self._execute_command(expanded_command, current_input)
-            except CommandException as exception:
-                return exception
-            if not self.is_running:
-                break
-        return current_input
-
-    def _execute_command(self, command, input):
+        external_commands = []
+        split_commands = PipelineSplitter.split_into_commands(commands)
+        try:
+            for index, command in enumerate(split_commands):
+                expanded_command = self._expander.parse(command)
+                if self._is_external(expanded_command):
+                    external_commands.append(expanded_command)
+                    continue
+                current_input = self._execute_external(external_commands, current_input)
+                external_commands = []
+                command_output = output if index == len(split_commands) - 1 else None
+                current_input = self._execute_command(expanded_command, current_input, command_output)
+                if not self.is_running:
+                    return current_input
+            return self._execute_external(external_commands, current_input)
+        except CommandException as exception:
+            return exception
+
+    @staticmethod
+    def _execute_external(commands, input):
+        return External.run_pipeline(commands, input) if commands else input
+
+    def _execute_command(self, command, input, output=None):
         if self._is_exit(command):
             self.is_running = False
             return
         if self._is_assignment(command):
             self._variables.__setitem__(*command[0].split('=', 1))
-        elif len(command) and self._supported_commands[command[0]] != External:
-            return self._supported_commands[command[0]].run(command[1:], input)
-        else:
+            return
+        command_runner = self._supported_commands[command[0]] if len(command) else External.run
+        if command_runner is External.run:
             return External.run(command, input)
+        command_stream = self._supported_commands.stream(command[0])
+        if command_stream is not None:
+            descriptor = self._file_descriptor(output)
+            if descriptor is not None:
+                output.flush()
+                return command_stream(command[1:], input, descriptor)
+        return command_runner(command[1:], input)
 
-    def _is_assignment(self, command):
-        return len(command) == 1 and bool(re.match(self._ASSIGNMENT_PATTERN, command[0]))
+    @staticmethod
+    def _file_descriptor(output):
+        """ Returns the file descriptor of the output, or None if there is none (as for io.StringIO). """
+        if output is None:
+            return None
+        try:
+            return output.fileno()
+        except (AttributeError, ValueError, OSError):
+            return None
+
+    def _is_external(self, command):
+        return (len(command) > 0 and self._supported_commands[command[0]] is External.run
+                and not self._is_exit(command) and not self._is_assignment(command))
+
+    @staticmethod
+    def _is_assignment(command):
+        if len(command) != 1:
+            return False
+        name_end = command[0].find('=')
+        # The name should consist of word characters, the same as the ones matched by \w
+        return name_end > 0 and command[0][:name_end].replace('_', 'a').isalnum()
 
     @staticmethod
     def _is_exit(command):
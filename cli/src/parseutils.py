@@ -1,7 +1,17 @@
 """ Module responsible for the parsing of user input into pipelines and commands. """
 
 import re
-from enum import Enum
+import sys
+from functools import lru_cache
+
+# The number of distinct inputs remembered by each of the cached parsing functions.
+_CACHE_SIZE = 256
+_PIPE = frozenset('|')
+# A quoted part of an expression: an opening quote up to the closing one or up to the end of the expression.
+# As quotes cannot be escaped, splitting by this regex leaves the unquoted parts at the even indexes.
+_QUOTED_RE = re.compile(r'''('[^']*'?|"[^"]*"?)''')
+_WHITESPACE_RE = re.compile(r'\s+')
+_VARIABLE_END_SEARCH = re.compile(r'''[\s'"$]''').search
 
 
 class PipelineSplitter(object):
@@ -11,15 +21,25 @@ class PipelineSplitter(object):
         """ Splits a pipeline into separate commands.
 
         The input string is split by the pipes (the | symbol) that are not in quotes.
+        The results for recent pipelines are cached, as the same pipelines are often run repeatedly.
 
         :param pipeline: The input string, a sequence of commands separated by pipelines.
         :return: A list of strings, each of which is a command.
         """
-        return QuoteParser.split_keeping_quotes(pipeline, re.compile(r'\|'))
+        return list(PipelineSplitter._split_into_commands(pipeline))
+
+    @staticmethod
+    @lru_cache(maxsize=_CACHE_SIZE)
+    def _split_into_commands(pipeline):
+        if not QuoteParser.has_quotes(pipeline):
+            return tuple(pipeline.split('|'))
+        return tuple(QuoteParser.split_keeping_quotes(pipeline, _PIPE))
 
 
 class CommandExpander(object):
     """ Class responsible for performing all necessary substitutions for a command. """
+    __slots__ = ('_variables',)
+
     def __init__(self, variables):
         """ Initializes the information about the variables to be used during substitution. """
         self._variables = variables
@@ -31,72 +51,76 @@ class CommandExpander(object):
         Their values are substituted according to the variable_names dictionary.
         The resulting string is divided into separate arguments,
         taking existing quotes into consideration and extra quotes are removed.
+        The command name is interned, so that it is found among the commands by identity.
+        The variables are expanded on every call, as their values may change,
+        but the arguments are cached by the expanded command, so repeated commands are not split again.
 
         :param command: A string containing the command to parse.
         :return: the same command as a list formatted for the convenience of command execution.
         """
-        command_with_expanded_variables = self._expand_variables(command)
-        return self._split_into_argument_list(command_with_expanded_variables)
+        return list(self._get_arguments(self._expand_variables(command)))
+
+    @staticmethod
+    @lru_cache(maxsize=_CACHE_SIZE)
+    def _get_arguments(command):
+        arguments = CommandExpander._split_into_argument_list(command)
+        if arguments:
+            arguments[0] = sys.intern(arguments[0])
+        return tuple(arguments)
 
     def _expand_variables(self, command):
-        dollar_indexes = QuoteParser.find_expandable_variables(command)
-        result = ''
-        cnt_index = 0
-        while cnt_index < len(command):
-            if cnt_index in dollar_indexes:
-                start_index = cnt_index + 1
-                cnt_index = self._find_variable_end(command, start_index)
-                variable = command[start_index:cnt_index]
-                result += self._variables[variable]
-            else:
-                result += command[cnt_index]
-                cnt_index += 1
-        return result
+        result = []
+        position = 0
+        for dollar_index in QuoteParser.find_expandable_variables(command):
+            result.append(command[position:dollar_index])
+            position = self._find_variable_end(command, dollar_index + 1)
+            result.append(self._variables[command[dollar_index + 1:position]])
+        result.append(command[position:])
+        return ''.join(result)
 
     @staticmethod
     def _find_variable_end(command, start_index):
-        for i in range(start_index, len(command)):
-            if re.match(re.compile(r'''\s|'|"|\$'''), command[i]):
-                return i
-        return len(command)
+        variable_end = _VARIABLE_END_SEARCH(command, start_index)
+        return variable_end.start() if variable_end else len(command)
 
     @staticmethod
     def _split_into_argument_list(command):
-        words = QuoteParser.split_keeping_quotes(command, re.compile(r'\s'))
-        without_quotes = list(map(QuoteParser.remove_quotes, words))
-        return [word for word in without_quotes if word != '']
-
-
-class _State(Enum):
-    """ The state of the expression being parsed (is it in single or double quotes). """
-    UNQUOTED = 0
-    IN_SINGLE = 1
-    IN_DOUBLE = 2
+        if not QuoteParser.has_quotes(command):
+            return command.split()
+        arguments = []
+        argument = []
+        for index, part in enumerate(_QUOTED_RE.split(command)):
+            if index % 2:
+                argument.append(QuoteParser._strip_quotes(part))
+                continue
+            words = _WHITESPACE_RE.split(part)
+            argument.append(words[0])
+            for word in words[1:]:
+                arguments.append(''.join(argument))
+                argument = [word]
+        arguments.append(''.join(argument))
+        return [argument for argument in arguments if argument]
+
+
+# The states of an expression being parsed (is it in single or double quotes).
+_UNQUOTED, _IN_SINGLE, _IN_DOUBLE = 0, 1, 2
+# The classes of the symbols of an expression that the states depend on.
+_OTHER_SYMBOL, _SINGLE_QUOTE, _DOUBLE_QUOTE = 0, 1, 2
+# _TRANSITIONS[state][symbol class] is the next state.
+_TRANSITIONS = (
+    (_UNQUOTED, _IN_SINGLE, _IN_DOUBLE),
+    (_IN_SINGLE, _UNQUOTED, _IN_SINGLE),
+    (_IN_DOUBLE, _IN_DOUBLE, _UNQUOTED),
+)
+_classify = {"'": _SINGLE_QUOTE, '"': _DOUBLE_QUOTE}.get
+# A bytes.translate table replacing every ASCII code with the class of its symbol.
+_CLASS_TABLE = bytes(_classify(chr(code), _OTHER_SYMBOL) for code in range(256))
 
 
 class QuoteParser(object):
     """ Class encapsulating all parsing of single and double quotes for an expression. """
     @staticmethod
-    def _next_state(state, next_symbol):
-        """ Calculates the state of the expression after a new symbol has been processed.
-
-        If there is no valid unclosed double quote and the symbol is a single quote,
-        the single quote is valid and changes the state accordingly.
-        If there is no valid unclosed single quote and the symbol is a double quote,
-        the double quote is valid and changes the state accordingly.
-
-        :param state: The current state of the expression being parsed.
-        :param next_symbol: A character that should be used to update the current state.
-        :return: A _State value corresponding to the next state.
-        """
-        if next_symbol == '"':
-            return _State(2 - state.value)
-        elif next_symbol == "'":
-            return _State(min(2, 1 ^ state.value))
-        else:
-            return state
-
-    @staticmethod
+    @lru_cache(maxsize=_CACHE_SIZE)
     def quotes_match(expression):
         """ Checks whether the expression has correctly closed all quotes.
 
@@ -107,29 +131,86 @@ class QuoteParser(object):
         :param expression: A string for which the quotes should be checked.
         :return: A bool value, are all of the quotes in the expression closed correctly.
         """
-        state = _State.UNQUOTED
-        for symbol in expression:
-            state = QuoteParser._next_state(state, symbol)
-        return state == _State.UNQUOTED
+        return QuoteParser.is_closed(QuoteParser.scan(expression))
 
     @staticmethod
+    def scan(expression, state=_UNQUOTED):
+        """ Calculates the state of an expression after the given part of it has been processed.
+
+        Allows parsing an expression that arrives in parts: the state returned for one part
+        should be passed on when scanning the next one, so no part is scanned twice.
+        If only one kind of quotes is used, every quote toggles the state, so counting them is enough.
+
+        :param expression: A string, the next part of the expression being parsed.
+        :param state: The state of the expression before this part.
+        :return: The state of the expression after this part: _UNQUOTED, _IN_SINGLE or _IN_DOUBLE.
+        """
+        if not QuoteParser.has_quotes(expression):
+            return state
+        if state == _UNQUOTED and '"' not in expression:
+            return _IN_SINGLE if expression.count("'") % 2 else state
+        if state == _UNQUOTED and "'" not in expression:
+            return _IN_DOUBLE if expression.count('"') % 2 else state
+        position = 0
+        if state != _UNQUOTED:
+            position = expression.find("'" if state == _IN_SINGLE else '"') + 1
+            if position == 0:
+                return state
+        quoted_parts = _QUOTED_RE.findall(expression, position)
+        if quoted_parts and not QuoteParser._is_closed_part(quoted_parts[-1]):
+            return _TRANSITIONS[_UNQUOTED][_classify(quoted_parts[-1][0])]
+        return _UNQUOTED
+
+    @staticmethod
+    def has_quotes(expression):
+        """ Checks whether the expression contains any quotes, so that the quote tracking can be skipped. """
+        return "'" in expression or '"' in expression
+
+    @staticmethod
+    def _classes(expression):
+        """ Classifies every symbol of the expression at once, returning bytes with the class of each symbol.
+
+        Symbols that are not ASCII are replaced while encoding, as they are never quotes.
+        """
+        return expression.encode('ascii', 'replace').translate(_CLASS_TABLE)
+
+    @staticmethod
+    def _is_closed_part(quoted_part):
+        """ Checks whether a quoted part found by _QUOTED_RE ends with its closing quote. """
+        return len(quoted_part) > 1 and quoted_part[-1] == quoted_part[0]
+
+    @staticmethod
+    def _strip_quotes(quoted_part):
+        """ Removes the opening quote of a quoted part found by _QUOTED_RE and its closing quote, if any. """
+        return quoted_part[1:-1] if QuoteParser._is_closed_part(quoted_part) else quoted_part[1:]
+
+    @staticmethod
+    def is_closed(state):
+        """ Checks whether all of the quotes are closed in an expression with the given state. """
+        return state == _UNQUOTED
+
+    @staticmethod
+    @lru_cache(maxsize=_CACHE_SIZE)
     def find_expandable_variables(expression):
         """ Finds all dollar symbols not in single quotes in an expression.
 
-        Returns a set of indexes in the given string of the dollar signs not in single quotes.
+        Returns the increasing indexes in the given string of the dollar signs not in single quotes.
         A variable preceded by a dollar sign might be expanded if it is in double quotes
         or unquoted, so only those dollar signs should be considered in the expansion process.
 
         :param expression: A string to find expandable variables in.
-        :return: A set of indexes of expandable variables, where the value at each index is '$'.
+        :return: A sorted tuple of indexes of expandable variables, where the value at each index is '$'.
         """
-        state = _State.UNQUOTED
-        result = set()
-        for i, symbol in enumerate(expression):
-            state = QuoteParser._next_state(state, symbol)
-            if state != _State.IN_SINGLE and symbol == '$':
-                result.add(i)
-        return result
+        result = []
+        offset = 0
+        for index, part in enumerate(_QUOTED_RE.split(expression)):
+            if index % 2 == 0 or part[0] == '"':
+                dollar_index = part.find('$')
+                while dollar_index >= 0:
+                    result.append(offset + dollar_index)
+                    dollar_index = part.find('$', dollar_index + 1)
+            offset += len(part)
+        return tuple(result)
 
     @staticmethod
     def find_unquoted_symbols(expression, pattern):
@@ -142,32 +223,48 @@ class QuoteParser(object):
         :param pattern: A regex pattern that matches some single characters.
         :return: A set of indexes of matching symbols in the expression.
         """
-        state = _State.UNQUOTED
+        state = _UNQUOTED
         result = set()
-        for i, symbol in enumerate(expression):
+        for i, symbol_class in enumerate(QuoteParser._classes(expression)):
             old_state = state
-            state = QuoteParser._next_state(state, symbol)
-            if re.match(pattern, symbol) and _State.UNQUOTED in (state, old_state):
+            state = _TRANSITIONS[state][symbol_class]
+            if (state == _UNQUOTED or old_state == _UNQUOTED) and pattern.match(expression[i]):
                 result.add(i)
         return result
 
     @staticmethod
     def remove_quotes(expression):
         """ Removes all unquoted quotes from the given expression, leaving the string literals. """
-        remove = QuoteParser.find_unquoted_symbols(expression, re.compile(r'''['"]'''))
-        return ''.join([expression[j] for j in range(len(expression)) if j not in remove])
+        if not QuoteParser.has_quotes(expression):
+            return expression
+        parts = _QUOTED_RE.split(expression)
+        parts[1::2] = map(QuoteParser._strip_quotes, parts[1::2])
+        return ''.join(parts)
 
     @staticmethod
-    def split_keeping_quotes(expression, pattern):
-        """ Splits the expression according to a pattern, keeping quoted values intact.
+    def split_keeping_quotes(expression, separators):
+        """ Splits the expression by the separator characters, keeping quoted values intact.
 
-        All substrings of the expression matching the pattern inside single or double quotes
-        will be ignored while splitting.
+        All of the separators inside single or double quotes will be ignored while splitting.
+        Only the quoted parts and the separators are visited one by one, the rest is skipped by a regex.
 
         :param expression: The string that should be split.
-        :param pattern: A regex pattern to split by.
-        :return: A list of substrings of the input expression, split by the pattern.
+        :param separators: A set of single characters, other than quotes, to split by.
+        :return: A list of substrings of the input expression, split by the separators.
         """
-        bad_symbol_indexes = sorted(QuoteParser.find_unquoted_symbols(expression, pattern))
-        breaks = [-1] + bad_symbol_indexes + [len(expression)]
-        return [expression[breaks[i - 1] + 1: breaks[i]] for i in range(1, len(breaks))]
+        if len(separators) == 1 and not QuoteParser.has_quotes(expression):
+            return expression.split(next(iter(separators)))
+        result = []
+        start = 0
+        for match in QuoteParser._separator_pattern(separators).finditer(expression):
+            if match.lastindex:
+                result.append(expression[start:match.start()])
+                start = match.end()
+        result.append(expression[start:])
+        return result
+
+    @staticmethod
+    @lru_cache(maxsize=_CACHE_SIZE)
+    def _separator_pattern(separators):
+        """ Compiles a regex matching either a whole quoted part or, in its only group, a separator. """
+        return re.compile(''''[^']*'?|"[^"]*"?|([{}])'''.format(re.escape(''.join(sorted(separators)))))
@@ -1,5 +1,7 @@
 import os
+import tempfile
 import unittest
+from unittest import mock
 from src.commands import Echo, Cat, Wc, External, Pwd, Grep, CommandException
 
 
@@ -19,19 +21,18 @@ class TestEcho(unittest.TestCase):
 
 
 class TestCat(unittest.TestCase):
-    def setUp(self):
-        self.path = 'test/resources/'
+    path = 'test/resources/'
 
     def test_empty(self):
         self.assertEqual(Cat.run([], None), None)
 
     def test_oneFile(self):
         result = Cat.run([self.path + 'oneFile'], None)
-        self.assertEqual(result.rstrip(), '5 4 3 2 1')
+        self.assertEqual(result, '5 4 3 2 1\n')
 
     def test_emptyFile(self):
         result = Cat.run([self.path + 'emptyFile'], None)
-        self.assertEqual(result.rstrip(), '')
+        self.assertEqual(result, '\n')
 
     def test_incorrectFileName(self):
         with self.assertRaises(CommandException) as raised:
@@ -46,19 +47,63 @@ class TestCat(unittest.TestCase):
         if os.name == 'posix':
             self.assertEqual(str(raised.exception), "cat: [Errno 21] Is a directory: 'test/resources/'")
 
+    @unittest.skipUnless(os.name == 'posix', 'the files are expected to have posix line endings')
     def test_severalFiles(self):
         result = Cat.run([self.path + 'oneFile', self.path + 'anotherFile'], None)
-        if os.name == 'posix':
-            self.assertEqual(result, '\n'.join(('5 4 3 2 1', '1 2 3', '4 5', '')))
+        self.assertEqual(result, '\n'.join(('5 4 3 2 1', '1 2 3', '4 5', '')))
 
     def test_noArgs(self):
         result = Cat.run([], 'inputted input')
         self.assertEqual(result, 'inputted input')
 
+    def test_stream(self):
+        with tempfile.TemporaryFile() as output:
+            self.assertEqual(Cat.stream([self.path + 'oneFile', self.path + 'anotherFile'], None, output.fileno()), '')
+            output.seek(0)
+            self.assertEqual(output.read(), b'5 4 3 2 1\n1 2 3\n4 5\n')
+
+    def test_streamNoArgs(self):
+        with tempfile.TemporaryFile() as output:
+            self.assertEqual(Cat.stream([], 'inputted input', output.fileno()), 'inputted input')
+
+    @unittest.skipUnless(hasattr(os, 'sendfile'), 'needs os.sendfile')
+    @mock.patch('src.commands._SENDFILE_THRESHOLD', 0)
+    def test_streamWithSendfile(self):
+        with mock.patch('os.sendfile', wraps=os.sendfile) as sendfile, tempfile.TemporaryFile() as output:
+            Cat.stream([self.path + 'oneFile'], None, output.fileno())
+            output.seek(0)
+            self.assertEqual(output.read(), b'5 4 3 2 1\n')
+        sendfile.assert_called()
+
+    @unittest.skipUnless(hasattr(os, 'sendfile'), 'needs os.sendfile')
+    @mock.patch('src.commands._SENDFILE_THRESHOLD', 0)
+    def test_streamSendfileFailingAfterPartialSend(self):
+        real_sendfile = os.sendfile
+        calls = []
+
+        def send_three_bytes_then_fail(out_fd, in_fd, offset, count):
+            calls.append(offset)
+            if len(calls) > 1:
+                raise OSError(22, 'Invalid argument')
+            return real_sendfile(out_fd, in_fd, offset, 3)
+
+        with tempfile.TemporaryFile() as output:
+            with mock.patch('os.sendfile', side_effect=send_three_bytes_then_fail):
+                Cat.stream([self.path + 'oneFile'], None, output.fileno())
+            output.seek(0)
+            self.assertEqual(output.read(), b'5 4 3 2 1\n')
+        self.assertEqual(calls, [0, 3])
+
+    def test_streamIncorrectFileName(self):
+        with tempfile.TemporaryFile() as output, self.assertRaises(CommandException) as raised:
+            Cat.stream([self.path + 'notFile'], None, output.fileno())
+        if os.name == 'posix':
+            self.assertEqual(str(raised.exception),
+                             "cat: [Errno 2] No such file or directory: 'test/resources/notFile'")
+
 
 class TestWc(unittest.TestCase):
-    def setUp(self):
-        self.path = 'test/resources/'
+    path = 'test/resources/'
 
     def test_empty(self):
         self.assertEqual(Wc.run([], None), None)
@@ -91,6 +136,18 @@ class TestWc(unittest.TestCase):
         result = Wc.run([], 'inputted input')
         self.assertEqual(result, '1 2 14')
 
+    def test_unicodeWhitespace(self):
+        self.assertEqual(Wc.run([], 'no\xa0break space'), '1 3 15')
+        self.assertEqual(Wc.run([], 'unit\x1fseparator'), '1 2 14')
+
+    @mock.patch('src.commands._BUFFER_SIZE', 3)
+    def test_unicodeWhitespaceCutByChunks(self):
+        with tempfile.TemporaryDirectory() as directory:
+            file_name = os.path.join(directory, 'words')
+            with open(file_name, 'w', encoding='utf-8', newline='') as fout:
+                fout.write('ab\xa0c d\u2003e\n')
+            self.assertEqual(Wc.run([file_name], None), '2 4 12')
+
 
 class TestExternal(unittest.TestCase):
     def test_noCommand(self):
@@ -99,30 +156,45 @@ class TestExternal(unittest.TestCase):
     def test_noCommandWithInput(self):
         self.assertEqual(External.run([], 'input'), None)
 
-    def test_wrongCommand(self):
+    @mock.patch('subprocess.Popen', side_effect=FileNotFoundError(2, 'No such file or directory'))
+    def test_wrongCommand(self, popen):
         with self.assertRaises(CommandException) as raised:
             External.run(['hello_kitty', '5'], None)
         self.assertEqual(str(raised.exception), 'hello_kitty: command not found...')
+        self.assertEqual(popen.call_args[0][0], ['hello_kitty', '5'])
 
-    def test_wrongCommandArguments(self):
+    @mock.patch('subprocess.Popen')
+    def test_wrongCommandArguments(self, popen):
+        popen.return_value.communicate.return_value = b'', 'find: ‘me’: No such file or directory\n'.encode()
+        popen.return_value.returncode = 1
         with self.assertRaises(CommandException) as raised:
             External.run(['find', 'me'], None)
-        if os.name == 'posix':  # Idk what Windows should say
-            self.assertEqual(str(raised.exception), 'find: ‘me’: No such file or directory')
+        self.assertEqual(str(raised.exception), 'find: ‘me’: No such file or directory')
 
+    @unittest.skipUnless(os.name == 'posix', 'needs the posix cat command')
     def test_commandWithInput(self):
-        if os.name == 'posix':
-            result = External.run(['cat'], 'test')
-            self.assertEqual(result, 'test')
+        result = External.run(['cat'], 'test')
+        self.assertEqual(result, 'test')
 
     def test_commandWithArgs(self):
         result = External.run(['echo', 'test'], None)
         self.assertEqual(result, 'test')
 
+    @unittest.skipUnless(os.name == 'posix', 'needs the posix cat command')
+    def test_pipeline(self):
+        result = External.run_pipeline([['cat'], ['cat'], ['cat']], 'test')
+        self.assertEqual(result, 'test')
+
+    def test_pipelineWithWrongCommand(self):
+        with self.assertRaises(CommandException) as raised:
+            External.run_pipeline([['echo', 'test'], ['hello_kitty', '5']], None)
+        self.assertEqual(str(raised.exception), 'hello_kitty: command not found...')
+
 
 class TestPwd(unittest.TestCase):
-    def setUp(self):
-        self.path = os.getcwd()
+    @classmethod
+    def setUpClass(cls):
+        cls.path = os.getcwd()
 
     def test_pwd(self):
         self.assertEqual(Pwd.run([], None), self.path)
@@ -135,8 +207,7 @@ class TestPwd(unittest.TestCase):
 
 
 class TestGrep(unittest.TestCase):
-    def setUp(self):
-        self.path = 'test/resources/'
+    path = 'test/resources/'
 
     def test_noInputNoFiles(self):
         self.assertEqual(Grep.run(['pattern'], None), '')
@@ -146,6 +217,10 @@ class TestGrep(unittest.TestCase):
         self.assertEqual(Grep.run(['find'], 'nothing for finding here'), 'nothing for finding here')
         self.assertEqual(Grep.run(['-i', 'find'], 'Finding nothing'), 'Finding nothing')
 
+    def test_grepOnMultilineInput(self):
+        self.assertEqual(Grep.run(['find'], 'find\nnothing\nfind again'), 'find\nfind again')
+        self.assertEqual(Grep.run(['-A', '1', 'find'], 'find\r\nnext\r\nlast'), 'find\r\nnext\r\n')
+
     def test_noMatches(self):
         self.assertEqual(Grep.run(['find'], 'nothing here'), '')
         self.assertEqual(Grep.run(['-w', 'find'], 'nothing for finding here'), '')
@@ -156,6 +231,29 @@ class TestGrep(unittest.TestCase):
         self.assertEqual(Grep.run(['-iwA', '10', 'find'], 'nothing for finding here'), '')
         self.assertEqual(Grep.run(['-iwA', '10', 'find'], 'Find nothing'), 'Find nothing')
 
+    def test_matchSpanningLines(self):
+        self.assertEqual(Grep.run([r'one\stwo'], 'one\ntwo\n'), '')
+        self.assertEqual(Grep.run(['-w', r'\s'], 'one\ntwo three\n'), 'two three\n')
+        self.assertEqual(Grep.run([r'\Afoo'], 'foo\nfoo\nbar\n'), 'foo\nfoo\n')
+        self.assertEqual(Grep.run([r'(?<!\n)foo'], 'foo\nfoo\nbar\n'), 'foo\nfoo\n')
+        self.assertEqual(Grep.run(['^$'], 'one\n\ntwo\n'), '\n')
+
+    def test_largeInput(self):
+        text = 'a b\n' * 100000
+        self.assertEqual(Grep.run(['a[^x]*z'], text), '')
+        self.assertEqual(Grep.run(['-i', 'a.*z|b[^q]+y'], text), '')
+        self.assertEqual(Grep.run(['-w', 'b'], text), text)
+
+    @mock.patch('src.commands._BUFFER_SIZE', 8)
+    def test_fileReadInChunks(self):
+        with tempfile.TemporaryDirectory() as directory:
+            file_name = os.path.join(directory, 'lines')
+            with open(file_name, 'w') as fout:
+                fout.write('foo\n' * 5 + 'bar\nbaz\n')
+            self.assertEqual(Grep.run([r'\Afoo', file_name], None), 'foo\n' * 5)
+            self.assertEqual(Grep.run(['-A', '1', 'o$', file_name], None), 'foo\n' * 5 + 'bar\n')
+            self.assertEqual(Grep.run(['-A', '1', '^ba', file_name], None), 'bar\nbaz\n')
+
     def test_wrongPattern(self):
         with self.assertRaises(CommandException) as raised:
             Grep.run([], None)
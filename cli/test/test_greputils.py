@@ -6,6 +6,9 @@ from src.greputils import GrepArguments, GrepOutputFormatter, ParsingException
 
 
 class TestGrepArguments(unittest.TestCase):
+    # The flags set by grep, all of the others (such as the implicit re.UNICODE) are not compared.
+    GREP_FLAGS = re.IGNORECASE | re.MULTILINE
+
     def testFiles_withoutArgs(self):
         self.assertListEqual(GrepArguments(['pattern']).files, [])
         self.assertListEqual(GrepArguments(['pattern', 'file']).files, ['file'])
@@ -61,14 +64,31 @@ class TestGrepArguments(unittest.TestCase):
         self.assertEqual(str(raised.exception), 'the following arguments are required: PATTERN, FILE')
 
     def testPattern_caseSensitive(self):
-        self.assertEqual(GrepArguments(['-A', '10', 'p', 'file']).pattern, re.compile('p'))
-        self.assertEqual(GrepArguments(['[A-Z]']).pattern, re.compile('[A-Z]'))
-        self.assertEqual(GrepArguments(['-w', 'pattern', 'file']).pattern, re.compile(r'\bpattern\b'))
+        self.assertPattern(GrepArguments(['-A', '10', 'p', 'file']).pattern, 'p', 0)
+        self.assertPattern(GrepArguments(['[A-Z]']).pattern, '[A-Z]', 0)
+        self.assertPattern(GrepArguments(['-w', 'pattern', 'file']).pattern, r'\bpattern\b', 0)
 
     def testPattern_caseInsensitive(self):
-        self.assertEqual(GrepArguments([ '-i', '-A', '10', 'p', 'file']).pattern, re.compile('p', re.IGNORECASE))
-        self.assertEqual(GrepArguments(['--ignore-case', '[A-Z]']).pattern, re.compile('[A-Z]', re.IGNORECASE))
-        self.assertEqual(GrepArguments(['-iw', 'pattern', 'file']).pattern, re.compile(r'\bpattern\b', re.IGNORECASE))
+        self.assertPattern(GrepArguments(['-i', '-A', '10', 'p', 'file']).pattern, 'p', re.IGNORECASE)
+        self.assertPattern(GrepArguments(['--ignore-case', '[A-Z]']).pattern, '[A-Z]', re.IGNORECASE)
+        self.assertPattern(GrepArguments(['-iw', 'pattern', 'file']).pattern, r'\bpattern\b', re.IGNORECASE)
+
+    def testTextPattern_multiline(self):
+        self.assertPattern(GrepArguments(['p', 'file']).text_pattern, 'p', re.MULTILINE)
+        self.assertPattern(GrepArguments(['-iw', 'p']).text_pattern, r'\bp\b', re.IGNORECASE | re.MULTILINE)
+        self.assertPattern(GrepArguments([r'^a\S+$']).text_pattern, r'^a\S+$', re.MULTILINE)
+        self.assertPattern(GrepArguments([r'(?:a|\.)\w']).text_pattern, r'(?:a|\.)\w', re.MULTILINE)
+
+    def testTextPattern_matchMayContainLineBreak(self):
+        self.assertIsNone(GrepArguments(['a[^x]*z']).text_pattern)
+        self.assertIsNone(GrepArguments([r'one\stwo']).text_pattern)
+        self.assertIsNone(GrepArguments([r'\W']).text_pattern)
+        self.assertIsNone(GrepArguments([r'(?s)a.']).text_pattern)
+
+    def testTextPattern_matchDependsOnStringBoundaries(self):
+        self.assertIsNone(GrepArguments([r'\Afoo']).text_pattern)
+        self.assertIsNone(GrepArguments([r'(?<!\n)foo']).text_pattern)
+        self.assertIsNone(GrepArguments(['$']).text_pattern)
 
     def testWasContextSet_notSet(self):
         self.assertFalse(GrepArguments(['-iw', 'pattern', 'file']).was_context_set)
@@ -81,61 +101,70 @@ class TestGrepArguments(unittest.TestCase):
         self.assertTrue(GrepArguments(['--after-context', '179', 'pattern']).was_context_set)
         self.assertTrue(GrepArguments(['--after-context=200', 'pattern']).was_context_set)
 
+    def assertPattern(self, pattern, source, flags):
+        self.assertEqual((pattern.pattern, pattern.flags & self.GREP_FLAGS), (source, flags))
+
 
 class TestGrepOutputFormatter(unittest.TestCase):
+    ONE_LINE = 'one line' + os.linesep
+    ANOTHER_LINE = 'another line' + os.linesep
+    NOT_A_MATCH = 'not a match' + os.linesep
+    ALSO_NO_MATCH = 'also no match' + os.linesep
+    ANOTHER_MATCHING_LINE = 'another matching line' + os.linesep
+    ONE_LINE_WITH_FILE = 'first:one line' + os.linesep
+    SPLIT_FILES = os.linesep.join(['first:one line', '--', 'second:another line', ''])
+    SPLIT_SEGMENTS = os.linesep.join(['first:one line', '--', 'first:another line', ''])
+    NOT_SPLIT = os.linesep.join(['first:one line', 'first:another line', ''])
+    WITH_CONTEXT = os.linesep.join(['first:one line',
+                                    'first-not a match',
+                                    '--',
+                                    'second:another line',
+                                    'second-also no match',
+                                    'second:another matching line',
+                                    ''])
+
     def testAddSplitter_differentFile(self):
-        expected = ['first:one line', '--', 'second:another line', '']
         output = GrepOutputFormatter(file_amount=3, needs_splitter=True)
-        output.add_line('first', 1, 'one line' + os.linesep, True)
-        output.add_line('second', 2, 'another line' + os.linesep, True)
-        self.assertEqual(output.format(), os.linesep.join(expected))
+        output.add_line('first', 1, self.ONE_LINE, True)
+        output.add_line('second', 2, self.ANOTHER_LINE, True)
+        self.assertEqual(output.format(), self.SPLIT_FILES)
 
     def testAddSplitter_sameFileNewSegment(self):
-        expected = ['first:one line', '--', 'first:another line', '']
         output = GrepOutputFormatter(file_amount=2, needs_splitter=True)
-        output.add_line('first', 1, 'one line' + os.linesep, True)
-        output.add_line('first', 3, 'another line' + os.linesep, True)
-        self.assertEqual(output.format(), os.linesep.join(expected))
+        output.add_line('first', 1, self.ONE_LINE, True)
+        output.add_line('first', 3, self.ANOTHER_LINE, True)
+        self.assertEqual(output.format(), self.SPLIT_SEGMENTS)
 
     def testAddSplitter_splitterNotSet(self):
-        expected = ['first:one line', 'first:another line', '']
         output = GrepOutputFormatter(file_amount=4, needs_splitter=False)
-        output.add_line('first', 1, 'one line' + os.linesep, True)
-        output.add_line('first', 4, 'another line' + os.linesep, True)
-        self.assertEqual(output.format(), os.linesep.join(expected))
+        output.add_line('first', 1, self.ONE_LINE, True)
+        output.add_line('first', 4, self.ANOTHER_LINE, True)
+        self.assertEqual(output.format(), self.NOT_SPLIT)
 
     def testAddSplitter_adjacentMatches(self):
-        expected = ['first:one line', 'first:another line', '']
         output = GrepOutputFormatter(file_amount=7, needs_splitter=True)
-        output.add_line('first', 1, 'one line' + os.linesep, True)
-        output.add_line('first', 2, 'another line' + os.linesep, True)
-        self.assertEqual(output.format(), os.linesep.join(expected))
+        output.add_line('first', 1, self.ONE_LINE, True)
+        output.add_line('first', 2, self.ANOTHER_LINE, True)
+        self.assertEqual(output.format(), self.NOT_SPLIT)
 
     def testAddFile_fileNeeded(self):
         output = GrepOutputFormatter(file_amount=2, needs_splitter=True)
-        output.add_line('first', 1, 'one line' + os.linesep, True)
-        self.assertEqual(output.format(), 'first:one line' + os.linesep)
+        output.add_line('first', 1, self.ONE_LINE, True)
+        self.assertEqual(output.format(), self.ONE_LINE_WITH_FILE)
 
     def testAddFile_fileNotNeeded(self):
         output = GrepOutputFormatter(file_amount=1, needs_splitter=True)
-        output.add_line('first', 1, 'one line' + os.linesep, True)
-        self.assertEqual(output.format(), 'one line' + os.linesep)
+        output.add_line('first', 1, self.ONE_LINE, True)
+        self.assertEqual(output.format(), self.ONE_LINE)
 
     def testFormat_filesWithLinesep(self):
-        expected = ['first:one line',
-                    'first-not a match',
-                    '--',
-                    'second:another line',
-                    'second-also no match',
-                    'second:another matching line',
-                    '']
         output = GrepOutputFormatter(file_amount=3, needs_splitter=True)
-        output.add_line('first', 1, 'one line' + os.linesep, True)
-        output.add_line('first', 2, 'not a match' + os.linesep, False)
-        output.add_line('second', 2, 'another line' + os.linesep, True)
-        output.add_line('second', 3, 'also no match' + os.linesep, False)
-        output.add_line('second', 4, 'another matching line' + os.linesep, True)
-        self.assertEqual(output.format(), os.linesep.join(expected))
+        output.add_line('first', 1, self.ONE_LINE, True)
+        output.add_line('first', 2, self.NOT_A_MATCH, False)
+        output.add_line('second', 2, self.ANOTHER_LINE, True)
+        output.add_line('second', 3, self.ALSO_NO_MATCH, False)
+        output.add_line('second', 4, self.ANOTHER_MATCHING_LINE, True)
+        self.assertEqual(output.format(), self.WITH_CONTEXT)
 
 
 if __name__ == '__main__':
@@ -1,5 +1,8 @@
+import io
 import os
+import tempfile
 import unittest
+from unittest import mock
 
 from src.commands import CommandException
 from src.interpreter import Interpreter, _EnvironmentVariables
@@ -15,6 +18,30 @@ class TestInterpreter(unittest.TestCase):
         self.assertEqual(self.emulator.execute_pipeline('echo some text | echo more text'), 'more text')
         self.assertEqual(self.emulator.execute_pipeline('echo some text | grep some'), 'some text')
 
+    @unittest.skipUnless(os.name == 'posix', 'needs the posix printf, sort and tr commands')
+    def testExecutePipeline_pipelineOfExternalCommands(self):
+        self.assertEqual(self.emulator.execute_pipeline('printf "b\\na\\n" | sort | tr a-z A-Z'), 'A\nB')
+        self.assertEqual(self.emulator.execute_pipeline('printf "b\\na\\n" | sort | grep a'), 'a\n')
+        self.assertEqual(self.emulator.execute_pipeline('echo some text | tr a-z A-Z | grep SOME'), 'SOME TEXT')
+        self.assertEqual(self.emulator.execute_pipeline('echo x | tr a-z A-Z | wc'), '1 1 1')
+
+    def testExecutePipeline_catStreamedToOutput(self):
+        with tempfile.TemporaryFile() as output:
+            self.assertEqual(self.emulator.execute_pipeline('echo 1 | cat test/resources/oneFile', output), '')
+            output.seek(0)
+            self.assertEqual(output.read(), b'5 4 3 2 1\n')
+
+    def testExecutePipeline_catOutputWithoutFileDescriptor(self):
+        output = io.StringIO()
+        self.assertEqual(self.emulator.execute_pipeline('cat test/resources/oneFile', output), '5 4 3 2 1\n')
+        self.assertEqual(output.getvalue(), '')
+
+    def testExecutePipeline_catInputStreamedToOutput(self):
+        with tempfile.TemporaryFile() as output:
+            self.assertEqual(self.emulator.execute_pipeline('echo 1 | cat', output), '1')
+            output.seek(0)
+            self.assertEqual(output.read(), b'')
+
     def testExecutePipeline_pipelineReturningNone(self):
         self.assertEqual(self.emulator.execute_pipeline(''), None)
         self.assertEqual(self.emulator.execute_pipeline('echo some text | echo some more text | var=179'), None)
@@ -63,8 +90,13 @@ class TestInterpreter(unittest.TestCase):
 
 
 class TestEnvironmentVariables(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        environment = mock.patch.dict(os.environ, {'a_var': 'value'})
+        environment.start()
+        cls.addClassCleanup(environment.stop)
+
     def setUp(self):
-        os.environ['a_var'] = 'value'
         self.variables = _EnvironmentVariables({'a': '6', 'b': '7', 'dog': 'cat'})
 
     def testFindVariableValue_inVariable(self):
@@ -82,6 +114,7 @@ class TestEnvironmentVariables(unittest.TestCase):
 
     def testAssign_inEnvironment(self):
         os.environ['a_var'] = 'another_value'
+        self.addCleanup(os.environ.__setitem__, 'a_var', 'value')
         self.assertEqual(self.variables['a_var'], 'another_value')
 
 
@@ -1,31 +1,38 @@
 import os
 import re
+import string
 import unittest
+from unittest import mock
 
 from src.interpreter import _EnvironmentVariables
-from src.parseutils import PipelineSplitter, QuoteParser, CommandExpander, _State
+from src.parseutils import PipelineSplitter, QuoteParser, CommandExpander, _UNQUOTED, _IN_SINGLE, _IN_DOUBLE
 
 
 class TestPipelineSplitter(unittest.TestCase):
-    def test_emptyString(self):
-        self.assertListEqual(PipelineSplitter.split_into_commands(''), [''])
-
-    def test_oneCommand(self):
-        self.assertListEqual(PipelineSplitter.split_into_commands('echo 4'), ['echo 4'])
-
-    def test_severalCommands(self):
+    PIPELINES = (('', ['']),
+                 ('echo 4', ['echo 4']),
+                 ('echo 4 | cat', ['echo 4 ', ' cat']),
+                 ("echo '4 | cat'", ["echo '4 | cat'"]),
+                 ('echo "4 | cat"', ['echo "4 | cat"']))
+
+    def test_splitIntoCommands(self):
+        for pipeline, commands in self.PIPELINES:
+            with self.subTest(pipeline=pipeline):
+                self.assertListEqual(PipelineSplitter.split_into_commands(pipeline), commands)
+
+    def test_repeatedPipeline(self):
+        PipelineSplitter.split_into_commands('echo 4 | cat').append('wc')
         self.assertListEqual(PipelineSplitter.split_into_commands('echo 4 | cat'), ['echo 4 ', ' cat'])
 
-    def test_pipelineInSingleQuotes(self):
-        self.assertListEqual(PipelineSplitter.split_into_commands("echo '4 | cat'"), ["echo '4 | cat'"])
-
-    def test_pipelineInDoubleQuotes(self):
-        self.assertListEqual(PipelineSplitter.split_into_commands('echo "4 | cat"'), ['echo "4 | cat"'])
-
 
 class TestCommandExpander(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        environment = mock.patch.dict(os.environ, {'a_var': 'value'})
+        environment.start()
+        cls.addClassCleanup(environment.stop)
+
     def setUp(self):
-        os.environ['a_var'] = 'value'
         self.expander = CommandExpander(_EnvironmentVariables({'a': '6', 'b': '7', 'dog': 'cat'}))
 
     def testParse_empty(self):
@@ -41,6 +48,12 @@ class TestCommandExpander(unittest.TestCase):
         self.assertListEqual(self.expander.parse('echo $a_var "$b"'), ['echo', 'value', '7'])
         self.assertListEqual(self.expander.parse('$dog $a$a $cat$a$a'), ['cat', '66', '66'])
 
+    def testParse_repeatedCommandWithChangedVariable(self):
+        self.assertListEqual(self.expander.parse('echo $a'), ['echo', '6'])
+        self.expander.parse('echo $a').append('7')
+        self.expander._variables['a'] = '8'
+        self.assertListEqual(self.expander.parse('echo $a'), ['echo', '8'])
+
     def testExpandVariables_noExpansions(self):
         self.assertEqual(self.expander._expand_variables(''), '')
         self.assertEqual(self.expander._expand_variables("not a '$var'"), "not a '$var'")
@@ -87,43 +100,53 @@ class QuoteParserTest(unittest.TestCase):
     LOWERCASE = re.compile('[a-z]')
     UPPERCASE = re.compile('[A-Z]')
     QUOTES = re.compile(r'''['"]''')
-
-    def testNextState_afterSingleQuote(self):
-        self.assertEqual(QuoteParser._next_state(_State.UNQUOTED, "'"), _State.IN_SINGLE)
-        self.assertEqual(QuoteParser._next_state(_State.IN_SINGLE, "'"), _State.UNQUOTED)
-        self.assertEqual(QuoteParser._next_state(_State.IN_DOUBLE, "'"), _State.IN_DOUBLE)
-
-    def testNextState_afterDoubleQuote(self):
-        self.assertEqual(QuoteParser._next_state(_State.UNQUOTED, '"'), _State.IN_DOUBLE)
-        self.assertEqual(QuoteParser._next_state(_State.IN_SINGLE, '"'), _State.IN_SINGLE)
-        self.assertEqual(QuoteParser._next_state(_State.IN_DOUBLE, '"'), _State.UNQUOTED)
-
-    def testNextState_afterNonQuote(self):
-        self.assertEqual(QuoteParser._next_state(_State.UNQUOTED, '`'), _State.UNQUOTED)
-        self.assertEqual(QuoteParser._next_state(_State.IN_SINGLE, '`'), _State.IN_SINGLE)
-        self.assertEqual(QuoteParser._next_state(_State.IN_DOUBLE, '`'), _State.IN_DOUBLE)
-
-    def testQuotesMatch_quotesMatch(self):
-        self.assertTrue(QuoteParser.quotes_match(''))
-        self.assertTrue(QuoteParser.quotes_match(r''''hello' "world"'''))
-
-    def testQuotesMatch_trailingSingleQuote(self):
-        self.assertFalse(QuoteParser.quotes_match("hello 'world"))
-        self.assertFalse(QuoteParser.quotes_match("'"))
-
-    def testQuotesMatch_trailingDoubleQuote(self):
-        self.assertFalse(QuoteParser.quotes_match('hello "world'))
-        self.assertFalse(QuoteParser.quotes_match('"'))
+    LOWERCASE_CHARS = frozenset(string.ascii_lowercase)
+    UPPERCASE_CHARS = frozenset(string.ascii_uppercase)
+    # Expressions and whether their quotes match: balanced, with a trailing single and a trailing double quote.
+    QUOTES_MATCH = (('', True),
+                    (r''''hello' "world"''', True),
+                    ("'hello' 'world'", True),
+                    ("hello 'world", False),
+                    ("'", False),
+                    ("'hello' 'world", False),
+                    ('hello "world', False),
+                    ('"', False))
+    # Expressions and the same expressions without quotes: no quotes, simple quotes and quotes inside quotes.
+    WITHOUT_QUOTES = (('', ''),
+                      ('expression without quotes', 'expression without quotes'),
+                      ('""', ''),
+                      ("''", ''),
+                      (r'''"quote"'removal'"test"''', 'quoteremovaltest'),
+                      (r'''"''"''', "''"),
+                      (r"""'""'""", '""'),
+                      (r'''"'quote'"'"removal"'"'test'"''', r"""'quote'"removal"'test'"""))
+
+    def testQuotesMatch(self):
+        for expression, quotes_match in self.QUOTES_MATCH:
+            with self.subTest(expression=expression):
+                self.assertEqual(QuoteParser.quotes_match(expression), quotes_match)
+
+    def testScan_expressionInParts(self):
+        self.assertEqual(QuoteParser.scan("echo 'hello"), _IN_SINGLE)
+        self.assertEqual(QuoteParser.scan(' "world', _IN_SINGLE), _IN_SINGLE)
+        self.assertEqual(QuoteParser.scan(r''''"''', _IN_SINGLE), _IN_DOUBLE)
+        self.assertEqual(QuoteParser.scan('echo "a" \'b\''), _UNQUOTED)
+        self.assertTrue(QuoteParser.is_closed(QuoteParser.scan('"', _IN_DOUBLE)))
+
+    def testHasQuotes(self):
+        self.assertFalse(QuoteParser.has_quotes('echo 5 | wc'))
+        self.assertTrue(QuoteParser.has_quotes("echo '5'"))
+        self.assertTrue(QuoteParser.has_quotes('echo "5'))
 
     def testFindExpandableVariables_noExpandableVariables(self):
-        self.assertSetEqual(QuoteParser.find_expandable_variables('echo 5'), set())
-        self.assertSetEqual(QuoteParser.find_expandable_variables(''), set())
-        self.assertSetEqual(QuoteParser.find_expandable_variables("echo '$5"), set())
+        self.assertTupleEqual(QuoteParser.find_expandable_variables('echo 5'), ())
+        self.assertTupleEqual(QuoteParser.find_expandable_variables(''), ())
+        self.assertTupleEqual(QuoteParser.find_expandable_variables("echo '$5"), ())
 
     def testFindExpandableVariables_withExpandableVariables(self):
-        self.assertSetEqual(QuoteParser.find_expandable_variables('echo $5'), {5})
-        self.assertSetEqual(QuoteParser.find_expandable_variables('$variable'), {0})
-        self.assertSetEqual(QuoteParser.find_expandable_variables('echo "$5 $6" | $7'), {6, 9, 15})
+        self.assertTupleEqual(QuoteParser.find_expandable_variables('echo $5'), (5,))
+        self.assertTupleEqual(QuoteParser.find_expandable_variables('$variable'), (0,))
+        self.assertTupleEqual(QuoteParser.find_expandable_variables('echo "$5 $6" | $7'), (6, 9, 15))
 
     def testFindUnquotedSymbols_noMatchesSimpleSymbols(self):
         self.assertSetEqual(QuoteParser.find_unquoted_symbols('', self.UPPERCASE), set())
@@ -139,28 +162,23 @@ class QuoteParserTest(unittest.TestCase):
         self.assertSetEqual(QuoteParser.find_unquoted_symbols(r'''"'"''"'"''', self.QUOTES), {0, 2, 3, 4, 5, 7})
         self.assertSetEqual(QuoteParser.find_unquoted_symbols(r'''a"b"'c'd''', self.QUOTES), {1, 3, 4, 6})
 
-    def testRemoveQuotes_noQuotes(self):
-        self.assertEqual(QuoteParser.remove_quotes(''), '')
-        self.assertEqual(QuoteParser.remove_quotes('expression without quotes'), 'expression without quotes')
-
-    def testRemoveQuotes_simpleQuotes(self):
-        self.assertEqual(QuoteParser.remove_quotes('""'), '')
-        self.assertEqual(QuoteParser.remove_quotes("''"), '')
-        self.assertEqual(QuoteParser.remove_quotes(r'''"quote"'removal'"test"'''), 'quoteremovaltest')
+    def testFindUnquotedSymbols_nonAsciiSymbols(self):
+        self.assertSetEqual(QuoteParser.find_unquoted_symbols("ü'a'ä\"b\"", self.QUOTES), {1, 3, 5, 7})
+        self.assertSetEqual(QuoteParser.find_unquoted_symbols("ü'ä'b", self.LOWERCASE), {4})
 
-    def testRemoveQuotes_quotesInsideQuotes(self):
-        self.assertEqual(QuoteParser.remove_quotes(r'''"''"'''), "''")
-        self.assertEqual(QuoteParser.remove_quotes(r"""'""'"""), '""')
-        self.assertEqual(QuoteParser.remove_quotes(r'''"'quote'"'"removal"'"'test'"'''), r"""'quote'"removal"'test'""")
+    def testRemoveQuotes(self):
+        for expression, without_quotes in self.WITHOUT_QUOTES:
+            with self.subTest(expression=expression):
+                self.assertEqual(QuoteParser.remove_quotes(expression), without_quotes)
 
     def testSplitKeepingQuotes_noMatchingPattern(self):
-        self.assertListEqual(QuoteParser.split_keeping_quotes('', self.UPPERCASE), [''])
-        self.assertListEqual(QuoteParser.split_keeping_quotes("aba'ABAcABA'", self.UPPERCASE), ["aba'ABAcABA'"])
-        self.assertListEqual(QuoteParser.split_keeping_quotes('aba"ABAcABA"', self.UPPERCASE), ['aba"ABAcABA"'])
+        self.assertListEqual(QuoteParser.split_keeping_quotes('', self.UPPERCASE_CHARS), [''])
+        self.assertListEqual(QuoteParser.split_keeping_quotes("aba'ABAcABA'", self.UPPERCASE_CHARS), ["aba'ABAcABA'"])
+        self.assertListEqual(QuoteParser.split_keeping_quotes('aba"ABAcABA"', self.UPPERCASE_CHARS), ['aba"ABAcABA"'])
 
     def testSplitKeepingQuotes_withMatchingPattern(self):
-        self.assertListEqual(QuoteParser.split_keeping_quotes("aCaba'AAc'", self.LOWERCASE), ['', 'C', '', '', "'AAc'"])
-        self.assertListEqual(QuoteParser.split_keeping_quotes('aCaba"AAc"', self.LOWERCASE), ['', 'C', '', '', '"AAc"'])
+        self.assertListEqual(QuoteParser.split_keeping_quotes("aCaba'AAc'", self.LOWERCASE_CHARS), ['', 'C', '', '', "'AAc'"])
+        self.assertListEqual(QuoteParser.split_keeping_quotes('aCaba"AAc"', self.LOWERCASE_CHARS), ['', 'C', '', '', '"AAc"'])
 
 
 if __name__ == '__main__':